@@ -0,0 +1,197 @@
+# api/cache.py
+"""
+A two-tier cache for answered queries. Repeated queries are matched exactly
+on a hash of the normalized query string, and paraphrased queries are matched
+on the cosine similarity of their embeddings. A hit skips retrieval and the
+LLM call entirely.
+"""
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+    logging.warning("numba is not installed; the semantic cache falls back to NumPy.")
+
+def _best_cosine(matrix: np.ndarray, q: np.ndarray) -> Tuple[int, float]:
+    """
+    Returns the index and score of the row of `matrix` with the highest dot
+    product with `q`. Both are expected to be L2-normalized, so the score is
+    the cosine similarity.
+    """
+    best_i, best = -1, -1.0
+    for i in range(matrix.shape[0]):
+        s = 0.0
+        for j in range(matrix.shape[1]):
+            s += matrix[i, j] * q[j]
+        if s > best:
+            best, best_i = s, i
+    return best_i, best
+
+if njit is not None:
+    # Fusing the dot products and the argmax into one pass avoids the
+    # temporary similarity array of `matrix @ q` and lets LLVM vectorize the
+    # inner loop. The cache is at most a few thousand rows, so a single
+    # thread beats the start-up cost of a parallel loop.
+    _best_cosine = njit(fastmath=True, cache=True)(_best_cosine)
+else:
+    def _best_cosine(matrix: np.ndarray, q: np.ndarray) -> Tuple[int, float]:
+        sims = matrix @ q
+        best_i = int(np.argmax(sims))
+        return best_i, float(sims[best_i])
+
+# A cached value is the (retrieved_chunks, llm_answer) pair of a query.
+CachedResult = Tuple[List[Dict[str, Any]], str]
+
+
+class SemanticQueryCache:
+    """
+    Caches query results with an exact (L1) and a semantic (L2) lookup.
+
+    Entries are evicted with the Greedy-Dual-Size-Frequency (GDSF) policy:
+    each entry has a priority of `clock + frequency * cost / size`, the entry
+    with the lowest priority is evicted first and the clock is advanced to its
+    priority, so entries that are hit often and were expensive to compute
+    survive longer than large, cheap, one-off answers.
+    """
+
+    def __init__(self, maxsize: int = 1024, dim: int = 384, similarity_threshold: float = 0.97):
+        """
+        Initializes an empty cache.
+
+        Args:
+            maxsize (int): The maximum number of cached queries.
+            dim (int): The dimension of the query embeddings.
+            similarity_threshold (float): The minimum cosine similarity for a
+                semantic hit.
+        """
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # Rows [0, len(self._row_keys)) hold the L2-normalized embeddings of
+        # the cached queries; self._row_keys[i] is the cache key of row i.
+        self._matrix = np.zeros((maxsize, dim), dtype=np.float32)
+        self._row_keys: List[str] = []
+        self._clock = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, top_k: int) -> str:
+        """Returns the exact-match key of a query."""
+        normalized = query.strip().lower()
+        return hashlib.sha256(f"{top_k}:{normalized}".encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str, top_k: int) -> Optional[CachedResult]:
+        """
+        Looks up a query by its normalized text.
+
+        Args:
+            query (str): The query text.
+            top_k (int): The number of chunks the query retrieves.
+
+        Returns:
+            Optional[CachedResult]: The cached result, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(self.make_key(query, top_k))
+            if entry is None:
+                return None
+            self._touch(entry)
+            return entry["value"]
+
+    def get_similar(self, query_embedding: np.ndarray, top_k: int) -> Optional[CachedResult]:
+        """
+        Looks up the cached query whose embedding is closest to the given one.
+
+        Args:
+            query_embedding (np.ndarray): The embedding of the query.
+            top_k (int): The number of chunks the query retrieves.
+
+        Returns:
+            Optional[CachedResult]: The cached result if the closest query is
+            similar enough and retrieved the same number of chunks, else None.
+        """
+        with self._lock:
+            n = len(self._row_keys)
+            if n == 0:
+                return None
+            q = np.asarray(query_embedding, dtype=np.float32)
+            q = q / np.linalg.norm(q)
+            best_i, best = _best_cosine(self._matrix[:n], q)
+            if best <= self.similarity_threshold:
+                return None
+            entry = self._entries[self._row_keys[best_i]]
+            if entry["top_k"] != top_k:
+                return None
+            logging.info(f"Semantic cache hit (similarity: {best:.4f}).")
+            self._touch(entry)
+            return entry["value"]
+
+    def put(self, query: str, query_embedding: np.ndarray, top_k: int,
+            value: CachedResult, cost: float):
+        """
+        Caches the result of a query, evicting entries if the cache is full.
+
+        Args:
+            query (str): The query text.
+            query_embedding (np.ndarray): The embedding of the query.
+            top_k (int): The number of chunks the query retrieved.
+            value (CachedResult): The (retrieved_chunks, llm_answer) pair.
+            cost (float): The time in seconds it took to compute the result.
+        """
+        key = self.make_key(query, top_k)
+        chunks, answer = value
+        size = len(answer) + sum(len(chunk["content"]) for chunk in chunks) or 1
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / np.linalg.norm(q)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.maxsize:
+                    self._evict()
+                entry = {"row": len(self._row_keys), "freq": 0}
+                self._entries[key] = entry
+                self._row_keys.append(key)
+            entry.update(value=value, top_k=top_k, cost=cost, size=size)
+            self._matrix[entry["row"]] = q
+            self._touch(entry)
+
+    def clear(self):
+        """Removes all entries, e.g. after new documents were ingested."""
+        with self._lock:
+            self._entries.clear()
+            self._row_keys.clear()
+            self._clock = 0.0
+
+    def _touch(self, entry: Dict[str, Any]):
+        """Records a use of an entry and refreshes its GDSF priority."""
+        entry["freq"] += 1
+        entry["priority"] = self._clock + entry["freq"] * entry["cost"] / entry["size"]
+
+    def _evict(self):
+        """Evicts the entry with the lowest GDSF priority."""
+        # A linear scan is fine here: evictions only happen after a full
+        # retrieval + LLM round trip, which dwarfs scanning maxsize entries.
+        key = min(self._entries, key=lambda k: self._entries[k]["priority"])
+        entry = self._entries.pop(key)
+        self._clock = entry["priority"]
+
+        # Keep the embedding matrix dense by moving the last row into the hole.
+        row, last = entry["row"], len(self._row_keys) - 1
+        last_key = self._row_keys.pop()
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._row_keys[row] = last_key
+            self._entries[last_key]["row"] = row
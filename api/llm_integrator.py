@@ -6,13 +6,13 @@ a fallback to general knowledge if retrieved documents are not relevant.
 """
 import os
 import logging
-from typing import List, Dict
+from typing import List, Dict, AsyncIterator, Iterator
 
 import google.generativeai as genai
 from dotenv import load_dotenv
 
-# Import both prompt templates
-from api.prompts import RAG_PROMPT_TEMPLATE, GENERAL_KNOWLEDGE_PROMPT_TEMPLATE
+# Import both prompt builders
+from api.prompts import build_rag_prompt, build_general_knowledge_prompt
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,6 +22,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # A lower value means higher relevance. 0.7 is a reasonable starting point.
 RELEVANCE_THRESHOLD = 0.7
 
+# Returned instead of an answer when the Gemini API call fails.
+ERROR_ANSWER = "Sorry, I encountered an error while generating an answer."
+
 class GeminiIntegrator:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
@@ -35,30 +38,86 @@ class GeminiIntegrator:
         
         logging.info("Gemini ('gemini-2.5-flash') model initialized successfully.")
 
-    def generate_answer(self, query: str, context_chunks: List[Dict[str, any]]) -> str:
+    def _build_prompt(self, query: str, context_chunks: List[Dict[str, any]]) -> str:
         """
-        Generates an answer using the LLM. It decides whether to use RAG context
-        or fall back to general knowledge based on the relevance of retrieved chunks.
+        Builds the LLM prompt. It decides whether to use RAG context or fall
+        back to general knowledge based on the relevance of retrieved chunks.
+        Callers that query the vector store with `max_distance=RELEVANCE_THRESHOLD`
+        only pass relevant chunks, so an empty list means nothing relevant was found.
         """
         # --- NEW LOGIC ---
         # Check if any relevant chunks were found
         if not context_chunks or context_chunks[0]["distance"] > RELEVANCE_THRESHOLD:
             logging.info("No relevant context found. Falling back to general knowledge.")
-            prompt = GENERAL_KNOWLEDGE_PROMPT_TEMPLATE.format(question=query)
-        else:
-            logging.info("Relevant context found. Using RAG prompt.")
-            # Format the context for the RAG prompt
-            context_str = "\n\n---\n\n".join(
-                [f"Source: {chunk['metadata']['source']}, Page: {chunk['metadata']['page']}\n\n"
-                 f"{chunk['content']}" for chunk in context_chunks]
-            )
-            prompt = RAG_PROMPT_TEMPLATE.format(question=query, context=context_str)
+            return build_general_knowledge_prompt(query)
+
+        logging.info("Relevant context found. Using RAG prompt.")
+        # Format the context for the RAG prompt
+        context_str = "\n\n---\n\n".join(
+            [f"Source: {chunk['metadata']['source']}, Page: {chunk['metadata']['page']}\n\n"
+             f"{chunk['content']}" for chunk in context_chunks]
+        )
+        return build_rag_prompt(query, context_str)
         # --- END OF NEW LOGIC ---
-        
+
+    def generate_answer(self, query: str, context_chunks: List[Dict[str, any]]) -> str:
+        """
+        Generates an answer using the LLM. It decides whether to use RAG context
+        or fall back to general knowledge based on the relevance of retrieved chunks.
+        """
+        prompt = self._build_prompt(query, context_chunks)
         try:
             logging.info("Sending request to Gemini API...")
             response = self.model.generate_content(prompt)
             return response.text
         except Exception as e:
             logging.error(f"Error calling Gemini API: {e}")
-            return "Sorry, I encountered an error while generating an answer."
\ No newline at end of file
+            return ERROR_ANSWER
+
+    def generate_answer_stream(self, query: str, context_chunks: List[Dict[str, any]]) -> Iterator[str]:
+        """
+        Streaming variant of `generate_answer` that yields the answer text
+        piece by piece as Gemini generates it. If the API call fails,
+        `ERROR_ANSWER` is yielded as the last piece.
+        """
+        prompt = self._build_prompt(query, context_chunks)
+        try:
+            logging.info("Sending streaming request to Gemini API...")
+            for chunk in self.model.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            logging.error(f"Error calling Gemini API: {e}")
+            yield ERROR_ANSWER
+
+    async def generate_answer_async(self, query: str, context_chunks: List[Dict[str, any]]) -> str:
+        """
+        Async variant of `generate_answer` that awaits the Gemini API call
+        instead of blocking a thread on it.
+        """
+        prompt = self._build_prompt(query, context_chunks)
+        try:
+            logging.info("Sending async request to Gemini API...")
+            response = await self.model.generate_content_async(prompt)
+            return response.text
+        except Exception as e:
+            logging.error(f"Error calling Gemini API: {e}")
+            return ERROR_ANSWER
+
+    async def stream_answer_async(self, query: str, context_chunks: List[Dict[str, any]]) -> AsyncIterator[str]:
+        """
+        Streaming variant of `generate_answer_async` that yields the answer text
+        piece by piece as Gemini generates it, so callers can forward the first
+        tokens without waiting for the full response. If the API call fails,
+        `ERROR_ANSWER` is yielded as the last piece.
+        """
+        prompt = self._build_prompt(query, context_chunks)
+        try:
+            logging.info("Sending streaming request to Gemini API...")
+            response = await self.model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            logging.error(f"Error calling Gemini API: {e}")
+            yield ERROR_ANSWER
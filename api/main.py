@@ -3,110 +3,269 @@
 Main FastAPI application for the RAG search engine.
 This module defines the API endpoints for ingestion, querying, and status checks.
 """
+import io
 import sys
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
 import logging
 
+import numpy as np
+
 # Add project root to the Python path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, AsyncIterator
 
 from index.vector_store import ChromaVectorStore
+from index.embedder import QueryEmbeddingBatcher
 from ingest.document_parser import extract_text_from_pdf
-from ingest.chunker import chunk_text
-from api.llm_integrator import GeminiIntegrator # <-- NEW IMPORT
+from ingest.chunker import iter_chunks
+from api.llm_integrator import GeminiIntegrator, ERROR_ANSWER, RELEVANCE_THRESHOLD # <-- NEW IMPORT
+from api.cache import SemanticQueryCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="RAG Knowledge Base Search Engine API",
-    description="An API to ingest documents and answer questions using RAG.",
-    version="1.0.0"
-)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logging.warning("orjson is not installed; streamed events are encoded with the json module.")
 
 # --- Global Initializations ---
 try:
     db_directory = project_root / "index" / "chroma_db"
     vector_store = ChromaVectorStore(db_path=str(db_directory))
     llm_integrator = GeminiIntegrator() # <-- INITIALIZE LLM
+    query_cache = SemanticQueryCache(dim=vector_store.embedder.dimension)
+    embedding_batcher = QueryEmbeddingBatcher(vector_store.embedder)
+    # Blocking parser, embedder and Chroma calls run on a dedicated thread pool
+    # so the event loop stays free. The parser fans large PDFs out to its own
+    # worker processes, so it does not need a process pool here.
+    worker_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-worker")
     logging.info("Vector store and LLM initialized successfully.")
 except Exception as e:
     logging.error(f"FATAL: Could not initialize components. {e}")
     raise
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the query embedding batcher and worker pool for the lifetime of the app."""
+    embedding_batcher.start()
+    yield
+    embedding_batcher.stop()
+    worker_executor.shutdown()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="RAG Knowledge Base Search Engine API",
+    description="An API to ingest documents and answer questions using RAG.",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
 # --- Pydantic Models for Request/Response Bodies ---
 class IngestRequest(BaseModel):
     file_path: str
 
 class QueryRequest(BaseModel):
     query: str
-    top_k: int = 3
+    # Two ~1000-character chunks keep the prompt near 500 tokens of context;
+    # more chunks mostly add LLM prefill time, not answer quality.
+    top_k: int = 2
+
+# Declaring a response model on every endpoint lets FastAPI serialize the
+# returned dicts straight to JSON bytes in pydantic-core, instead of running
+# them through jsonable_encoder and the stdlib json module.
+class StatusResponse(BaseModel):
+    status: str
+    indexed_chunks: int
+
+class DocumentsResponse(BaseModel):
+    documents: List[str]
+
+class IngestResponse(BaseModel):
+    status: str
+    file_path: str
+    chunks_added: int
 
 class QueryResponse(BaseModel): # <-- UPDATED RESPONSE MODEL
     llm_answer: str
     retrieved_chunks: List[Dict]
 
 # --- API Endpoints ---
-@app.get("/status", summary="Check API and vector store status")
-def get_status():
+@app.get("/status", response_model=StatusResponse, summary="Check API and vector store status")
+async def get_status():
     """Returns the health status of the API and vector store."""
+    loop = asyncio.get_running_loop()
     try:
-        count = vector_store.collection.count()
+        count = await loop.run_in_executor(worker_executor, vector_store.collection.count)
         return {"status": "ok", "indexed_chunks": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Vector store connection failed: {e}")
 
-@app.get("/list-docs", summary="List all ingested document sources")
-def list_documents():
+@app.get("/list-docs", response_model=DocumentsResponse, summary="List all ingested document sources")
+async def list_documents():
     """Returns a list of unique source document paths from the metadata."""
+    loop = asyncio.get_running_loop()
     try:
-        all_entries = vector_store.collection.get()
-        if not all_entries or not all_entries['metadatas']:
-            return {"documents": []}
-
-        unique_sources = sorted(list(set(meta['source'] for meta in all_entries['metadatas'])))
+        unique_sources = await loop.run_in_executor(worker_executor, vector_store.list_sources)
         return {"documents": unique_sources}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve documents: {e}")
 
-@app.post("/ingest", summary="Ingest a new document")
-def ingest_document(request: IngestRequest):
+@app.post("/ingest", response_model=IngestResponse, summary="Ingest a new document")
+async def ingest_document(request: IngestRequest):
     """Processes and indexes a document from a given file path."""
     file_path = Path(request.file_path)
     if not file_path.exists():
         raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
 
+    loop = asyncio.get_running_loop()
     try:
         logging.info(f"Starting ingestion for {file_path}...")
-        doc_generator = extract_text_from_pdf(file_path)
-        chunks = chunk_text(doc_generator)
-        vector_store.add_documents(chunks)
+        # Parsing, chunking, embedding and indexing are streamed in one pass
+        chunks = iter_chunks(extract_text_from_pdf(file_path))
+        # Re-ingesting a path replaces the chunks stored for it
+        chunks_added = await loop.run_in_executor(
+            worker_executor, vector_store.add_documents, chunks, str(file_path)
+        )
+        # Cached answers may be stale now that the knowledge base changed
+        query_cache.clear()
         logging.info(f"Successfully ingested {file_path}.")
-        return {"status": "success", "file_path": str(file_path), "chunks_added": len(chunks)}
+        return {"status": "success", "file_path": str(file_path), "chunks_added": chunks_added}
     except Exception as e:
         logging.error(f"Ingestion failed for {file_path}. Error: {e}")
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
 
+@app.post("/ingest/upload", response_model=IngestResponse, summary="Ingest an uploaded document")
+async def ingest_upload(file: UploadFile = File(...)):
+    """
+    Processes and indexes a PDF sent as a multipart upload. The document is
+    parsed from memory, so clients do not need to share a filesystem with the
+    API. The upload's filename is recorded as the chunks' source, and an
+    upload replaces any document stored under the same name.
+    """
+    loop = asyncio.get_running_loop()
+    # Multipart clients may omit the filename
+    filename = file.filename or "upload.pdf"
+    try:
+        logging.info(f"Starting ingestion for upload '{filename}'...")
+        data = await file.read()
+        chunks = iter_chunks(extract_text_from_pdf(io.BytesIO(data), source=filename))
+        # Uploading a file with the same name replaces the chunks stored for it
+        chunks_added = await loop.run_in_executor(
+            worker_executor, vector_store.add_documents, chunks, filename
+        )
+        # Cached answers may be stale now that the knowledge base changed
+        query_cache.clear()
+        logging.info(f"Successfully ingested upload '{filename}'.")
+        return {"status": "success", "file_path": filename, "chunks_added": chunks_added}
+    except Exception as e:
+        logging.error(f"Ingestion failed for upload '{filename}'. Error: {e}")
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+
+async def _cached_or_embedding(request: QueryRequest) -> Tuple[Optional[tuple], Optional[np.ndarray]]:
+    """
+    Looks the query up in the cache, first by its exact text and then by the
+    similarity of its embedding. Returns the cached (chunks, answer) pair, or
+    None on a miss, together with the query embedding for reuse in retrieval
+    (None when the exact lookup hit and no embedding was needed).
+    """
+    cached = query_cache.get(request.query, request.top_k)
+    if cached is not None:
+        return cached, None
+    query_embedding = await asyncio.wrap_future(embedding_batcher.submit(request.query))
+    return query_cache.get_similar(query_embedding, request.top_k), query_embedding
+
+def _cache_answer(request: QueryRequest, query_embedding, retrieved_chunks, pieces: List[str], start: float):
+    """
+    Caches an answer generated in one or more pieces, unless the LLM call
+    failed (a failed stream ends with `ERROR_ANSWER` after any partial text).
+    """
+    if pieces and pieces[-1] != ERROR_ANSWER:
+        query_cache.put(
+            request.query, query_embedding, request.top_k,
+            (retrieved_chunks, "".join(pieces)), cost=time.perf_counter() - start
+        )
+
 @app.post("/query", response_model=QueryResponse, summary="Query the knowledge base with RAG")
-def query_index(request: QueryRequest): # <-- UPDATED ENDPOINT LOGIC
+async def query_index(request: QueryRequest): # <-- UPDATED ENDPOINT LOGIC
     """Searches the vector store, feeds context to an LLM, and returns a synthesized answer."""
+    loop = asyncio.get_running_loop()
     try:
+        # Step 0: Serve repeated or paraphrased queries from the cache
+        cached, query_embedding = await _cached_or_embedding(request)
+        if cached is not None:
+            retrieved_chunks, llm_answer = cached
+            return {"llm_answer": llm_answer, "retrieved_chunks": retrieved_chunks}
+
+        start = time.perf_counter()
         # Step 1: Retrieve relevant chunks
-        retrieved_chunks = vector_store.query(request.query, k=request.top_k)
+        retrieved_chunks = await loop.run_in_executor(
+            worker_executor, vector_store.query,
+            request.query, request.top_k, query_embedding, RELEVANCE_THRESHOLD
+        )
 
         # Step 2: Generate an answer using the LLM
-        llm_answer = llm_integrator.generate_answer(request.query, retrieved_chunks)
+        llm_answer = await llm_integrator.generate_answer_async(request.query, retrieved_chunks)
+        _cache_answer(request, query_embedding, retrieved_chunks, [llm_answer], start)
 
-        return QueryResponse(
-            llm_answer=llm_answer,
-            retrieved_chunks=retrieved_chunks
-        )
+        return {"llm_answer": llm_answer, "retrieved_chunks": retrieved_chunks}
     except Exception as e:
         logging.error(f"Query failed for '{request.query}'. Error: {e}")
-        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Query failed: {e}")
+
+def _sse_event(event: str, data) -> bytes:
+    """Formats one server-sent event with a JSON-encoded payload."""
+    payload = orjson.dumps(data) if orjson is not None else json.dumps(data).encode()
+    return b"event: " + event.encode() + b"\ndata: " + payload + b"\n\n"
+
+@app.post("/query/stream", summary="Query the knowledge base with RAG and stream the answer")
+async def query_index_stream(request: QueryRequest):
+    """
+    Same as `/query`, but streams the result as server-sent events so clients
+    can show the answer as it is generated. The retrieved chunks are sent first
+    as a `chunks` event, followed by one `token` event per piece of the answer
+    and a final `done` event. Failures are reported as an `error` event.
+    """
+    async def events() -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        try:
+            cached, query_embedding = await _cached_or_embedding(request)
+            if cached is not None:
+                retrieved_chunks, llm_answer = cached
+                yield _sse_event("chunks", retrieved_chunks)
+                yield _sse_event("token", llm_answer)
+                yield _sse_event("done", {})
+                return
+
+            start = time.perf_counter()
+            retrieved_chunks = await loop.run_in_executor(
+                worker_executor, vector_store.query,
+                request.query, request.top_k, query_embedding, RELEVANCE_THRESHOLD
+            )
+            yield _sse_event("chunks", retrieved_chunks)
+
+            pieces = []
+            async for piece in llm_integrator.stream_answer_async(request.query, retrieved_chunks):
+                pieces.append(piece)
+                yield _sse_event("token", piece)
+            _cache_answer(request, query_embedding, retrieved_chunks, pieces, start)
+            yield _sse_event("done", {})
+        except Exception as e:
+            logging.error(f"Streaming query failed for '{request.query}'. Error: {e}")
+            yield _sse_event("error", {"detail": f"Query failed: {e}"})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
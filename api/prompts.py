@@ -30,4 +30,21 @@ After providing the answer, you MUST include the following disclaimer on a new l
 QUESTION: {question}
 
 ANSWER:
-"""
\ No newline at end of file
+"""
+
+# --- Precompiled templates ---
+# The templates are split around their placeholders once at import time, so
+# building a prompt is a single f-string concatenation instead of re-parsing
+# the template with str.format on every request.
+_RAG_PRE, _rest = RAG_PROMPT_TEMPLATE.split("{question}")
+_RAG_MID, _RAG_POST = _rest.split("{context}")
+_GENERAL_PRE, _GENERAL_POST = GENERAL_KNOWLEDGE_PROMPT_TEMPLATE.split("{question}")
+del _rest
+
+def build_rag_prompt(question: str, context: str) -> str:
+    """Equivalent to `RAG_PROMPT_TEMPLATE.format(question=question, context=context)`."""
+    return f"{_RAG_PRE}{question}{_RAG_MID}{context}{_RAG_POST}"
+
+def build_general_knowledge_prompt(question: str) -> str:
+    """Equivalent to `GENERAL_KNOWLEDGE_PROMPT_TEMPLATE.format(question=question)`."""
+    return f"{_GENERAL_PRE}{question}{_GENERAL_POST}"
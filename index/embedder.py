@@ -5,44 +5,127 @@ sentence-transformer model. It also provides an optional fallback
 to use OpenAI's embedding models.
 """
 import logging
-from typing import List
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
 
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
 
+from index.embedding_cache import EmbeddingCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Number of documents per forward pass when embedding chunks. Larger batches
+# than SentenceTransformer's default of 32 mean fewer kernel launches; a GPU
+# has the parallelism to fill a larger batch still.
+DOCUMENT_BATCH_SIZE = 64
+GPU_DOCUMENT_BATCH_SIZE = 128
+
 class LocalEmbedder:
     """A class to handle creating embeddings using a local model."""
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", quantize: bool = True):
         """
         Initializes the embedder by loading the sentence-transformer model.
 
         Args:
             model_name (str): The name of the model to use.
+            quantize (bool): Whether to quantize the model's linear layers to
+                int8 when running on CPU, or to run the model in FP16 on GPU.
         """
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
         try:
-            self.model = SentenceTransformer(model_name)
+            self.model = SentenceTransformer(model_name, device=self.device)
             logging.info(f"Local embedding model '{model_name}' loaded successfully.")
         except Exception as e:
             logging.error(f"Failed to load sentence-transformer model '{model_name}'. Error: {e}")
             raise
 
-    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        self.model_name = model_name
+        get_dimension = getattr(self.model, "get_embedding_dimension",
+                                self.model.get_sentence_embedding_dimension)
+        self.dimension = get_dimension()
+        self.quantized = False
+        self.precision = "fp32"
+        self.batch_size = DOCUMENT_BATCH_SIZE
+        if self.model.device.type == "cuda":
+            self.batch_size = GPU_DOCUMENT_BATCH_SIZE
+            if quantize:
+                # Tensor cores run FP16 matmuls at several times the FP32 rate
+                self.model.half()
+                self.precision = "fp16"
+                logging.info("Running embedding model in FP16 on GPU.")
+        elif quantize:
+            self._quantize()
+
+    @property
+    def cache_namespace(self) -> str:
+        """Identifies this model configuration in an `EmbeddingCache`."""
+        return f"{self.model_name}:{self.precision}:normalized"
+
+    def _quantize(self):
+        """
+        Applies dynamic int8 quantization to the model's linear layers. The
+        transformer matmuls dominate embedding time on CPU, and int8 kernels
+        (VNNI on modern x86) roughly double their throughput while halving the
+        weight memory traffic. Falls back to FP32 if quantization fails.
+        """
+        try:
+            torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+            self.quantized = True
+            self.precision = "int8"
+            logging.info("Quantized embedding model to int8.")
+        except Exception as e:
+            logging.warning(f"Failed to quantize embedding model, using FP32. Error: {e}")
+
+    def embed_documents(self, texts: List[str], cache: Optional[EmbeddingCache] = None,
+                        progress: bool = False) -> np.ndarray:
         """
         Creates embeddings for a list of documents.
 
         Args:
             texts (List[str]): A list of text strings to embed.
+            cache (Optional[EmbeddingCache]): If given, embeddings of texts
+                seen before are read from the cache and only the remaining
+                texts are run through the model.
+            progress (bool): Whether to show a progress bar. Off by default,
+                since it only adds overhead and log noise in the API server.
 
         Returns:
             np.ndarray: A numpy array of embeddings.
         """
         if not texts:
             return np.array([])
+        if cache is None:
+            return self._encode(texts, progress)
+
+        keys = cache.make_keys(texts)
+        hits = cache.get_many(keys)
+        miss_idx = [i for i, key in enumerate(keys) if key not in hits]
+        logging.info(f"Embedding cache: {len(texts) - len(miss_idx)} hits, {len(miss_idx)} misses.")
+
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if miss_idx:
+            new_embeddings = self._encode([texts[i] for i in miss_idx], progress)
+            embeddings[miss_idx] = new_embeddings
+            cache.set_many(zip([keys[i] for i in miss_idx], new_embeddings))
+        for i, key in enumerate(keys):
+            if key in hits:
+                embeddings[i] = hits[key]
+        return embeddings
+
+    def _encode(self, texts: List[str], progress: bool = False) -> np.ndarray:
         logging.info(f"Creating embeddings for {len(texts)} documents.")
-        embeddings = self.model.encode(texts, show_progress_bar=True)
+        embeddings = self.model.encode(
+            texts, batch_size=self.batch_size, show_progress_bar=progress,
+            convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32, copy=False)
         logging.info(f"Successfully created embeddings of shape: {embeddings.shape}")
         return embeddings
 
@@ -56,7 +139,143 @@ class LocalEmbedder:
         Returns:
             np.ndarray: The embedding for the query.
         """
-        return self.model.encode(text)
+        return self.model.encode(text, normalize_embeddings=True)
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        Creates embeddings for a batch of query strings in one model call.
+
+        Args:
+            texts (List[str]): The query texts to embed.
+
+        Returns:
+            np.ndarray: A numpy array with one embedding per query.
+        """
+        return self.model.encode(
+            texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True
+        )
+
+
+# The shared embedder of this process, created on first use by `get_embedder`.
+_EMBEDDER: Optional[LocalEmbedder] = None
+_EMBEDDER_LOCK = threading.Lock()
+
+def get_embedder() -> LocalEmbedder:
+    """
+    Returns the process-wide `LocalEmbedder`, loading the model on first use.
+    Every vector store in the process shares it, so the weights are loaded
+    (and quantized) only once.
+    """
+    global _EMBEDDER
+    if _EMBEDDER is None:
+        with _EMBEDDER_LOCK:
+            if _EMBEDDER is None:
+                _EMBEDDER = LocalEmbedder()
+    return _EMBEDDER
+
+
+class QueryEmbeddingBatcher:
+    """
+    Coalesces concurrent query embeddings into batched model calls.
+
+    Callers submit a query and get a future back. A background thread waits
+    up to `max_wait` seconds for more queries to arrive and then embeds up to
+    `max_batch` of them with a single forward pass, so N concurrent requests
+    cost one batched call instead of N calls of batch size 1.
+    """
+
+    def __init__(self, embedder: LocalEmbedder, max_batch: int = 32, max_wait: float = 0.008):
+        """
+        Initializes the batcher. Call `start()` before submitting queries.
+
+        Args:
+            embedder (LocalEmbedder): The embedder used for the batched calls.
+            max_batch (int): The maximum number of queries per model call.
+            max_wait (float): How long to wait for a batch to fill, in seconds.
+        """
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Starts the background worker thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="query-embedding-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stops the worker after it has embedded the pending queries."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, text: str) -> Future:
+        """
+        Queues a query for embedding.
+
+        Args:
+            text (str): The query text to embed.
+
+        Returns:
+            Future: A future that resolves to the query embedding.
+        """
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embeds a query, blocking until its batch has been processed."""
+        return self.submit(text).result()
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item] if self._claim(item) else []
+            deadline = time.monotonic() + self.max_wait
+            while batch and len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                if self._claim(item):
+                    batch.append(item)
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.embedder.embed_queries(texts)
+            except Exception as e:
+                logging.error(f"Failed to embed a batch of {len(texts)} queries. Error: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    @staticmethod
+    def _claim(item: Tuple[str, Future]) -> bool:
+        """
+        Marks a queued query's future as running. Returns False if the caller
+        already cancelled it (e.g. the client disconnected), in which case the
+        query is dropped; a running future can no longer be cancelled, so
+        setting its result afterwards cannot fail.
+        """
+        return item[1].set_running_or_notify_cancel()
 
 def main():
     """
@@ -76,7 +295,7 @@ def main():
     ]
 
     # Create embeddings
-    embeddings = embedder.embed_documents(sample_texts)
+    embeddings = embedder.embed_documents(sample_texts, progress=True)
 
     if embeddings.any():
         print(f"\nSuccessfully generated embeddings.")
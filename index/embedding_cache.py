@@ -0,0 +1,90 @@
+# index/embedding_cache.py
+"""
+This module provides a persistent cache of document embeddings keyed by a
+hash of the chunk text, so re-ingesting a document (or an overlapping one)
+only embeds the chunks that actually changed.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# SQLite limits the number of parameters per statement, so lookups are split.
+_LOOKUP_BATCH_SIZE = 500
+
+class EmbeddingCache:
+    """A SQLite-backed map from chunk-text hashes to float32 embeddings."""
+
+    def __init__(self, path: Path, namespace: str):
+        """
+        Opens (or creates) the cache.
+
+        Args:
+            path (Path): Path to the SQLite file.
+            namespace (str): Identifies the model that produced the embeddings,
+                so embeddings from different models are never mixed up.
+        """
+        self.path = Path(path)
+        self.namespace = namespace
+        # blake2b is in the standard library and faster than sha256; hashing
+        # the namespace once lets every key reuse that prefix state.
+        self._hasher = hashlib.blake2b(namespace.encode() + b"\0", digest_size=16)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def make_keys(self, texts: List[str]) -> List[bytes]:
+        """Returns the cache key of each text."""
+        keys = []
+        for text in texts:
+            hasher = self._hasher.copy()
+            hasher.update(text.encode())
+            keys.append(hasher.digest())
+        return keys
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Looks up embeddings by key.
+
+        Args:
+            keys (List[bytes]): The keys to look up.
+
+        Returns:
+            Dict[bytes, np.ndarray]: The embeddings that were found, by key.
+        """
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH_SIZE):
+                batch = keys[i:i + _LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def set_many(self, items: Iterable[Tuple[bytes, np.ndarray]]):
+        """Stores (key, embedding) pairs."""
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,125 @@
+# index/embedding_shadow.py
+"""
+This module keeps a flat, memory-mapped copy of the embeddings stored in
+Chroma, so candidates recalled by the HNSW index can be re-scored exactly
+without reading their vectors back out of Chroma's SQLite database.
+
+ChromaVectorStore does not keep a shadow up to date: Chroma already returns
+exact inner-product distances for the candidates it recalls, so re-scoring
+them cannot change their order. A shadow only pays off for a consumer that
+needs the candidates' vectors themselves, such as MMR diversification.
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# File suffix of the matrix for each supported storage dtype
+_SUFFIXES = {np.dtype(np.float16): "f16", np.dtype(np.float32): "f32"}
+
+class EmbeddingShadow:
+    """
+    An append-only matrix of embeddings on disk, with an `ids.txt` sidecar
+    that names each row.
+
+    Rows are read through `np.memmap`, so looking up a few hundred candidates
+    only touches their pages and hot rows stay in the OS page cache. Rows are
+    stored as float32 by default, so scores match Chroma's own distances.
+    float16 storage halves the file and its page-cache footprint, but keeps
+    only about three significant digits, so its scores must not replace
+    exact distances (e.g. before a relevance threshold is applied).
+    """
+
+    def __init__(self, directory: Path, dim: int, dtype: np.dtype = np.float32):
+        """
+        Opens (or creates) the shadow files in `directory`.
+
+        Args:
+            directory (Path): Directory holding the matrix and `ids.txt`.
+                It is created if it does not exist.
+            dim (int): The dimension of the embeddings.
+            dtype (np.dtype): The storage dtype, float16 or float32.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = self.directory / f"embeddings.{_SUFFIXES[self.dtype]}"
+        self.ids_path = self.directory / "ids.txt"
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._count = 0
+        self._matrix: Optional[np.memmap] = None
+        self._load()
+
+    def _load(self):
+        """Reads the id sidecar, dropping rows left incomplete by an interrupted write."""
+        ids = self.ids_path.read_text().splitlines() if self.ids_path.exists() else []
+        row_bytes = self.dim * self.dtype.itemsize
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        count = min(len(ids), size // row_bytes)
+        if count != len(ids) or size != count * row_bytes:
+            logging.warning(f"Embedding shadow in '{self.directory}' is out of sync; truncating to {count} rows.")
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(count * row_bytes)
+            self.ids_path.write_text("".join(f"{chunk_id}\n" for chunk_id in ids[:count]))
+        # A re-added id points at its newest row
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(ids[:count])}
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, ids: List[str], embeddings: np.ndarray):
+        """
+        Appends embeddings to the shadow.
+
+        Args:
+            ids (List[str]): The chunk id of each embedding.
+            embeddings (np.ndarray): A `(len(ids), dim)` array of embeddings.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=self.dtype).reshape(len(ids), self.dim)
+        with self._lock:
+            with open(self.vectors_path, "ab") as f:
+                f.write(embeddings.tobytes())
+            with open(self.ids_path, "a") as f:
+                f.write("".join(f"{chunk_id}\n" for chunk_id in ids))
+            for chunk_id in ids:
+                self._rows[chunk_id] = self._count
+                self._count += 1
+            # The file grew, so the next read maps it again
+            self._matrix = None
+
+    def _get_matrix(self) -> np.memmap:
+        if self._matrix is None:
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=self.dtype, mode="r", shape=(self._count, self.dim)
+            )
+        return self._matrix
+
+    def score(self, query_embedding: np.ndarray, ids: List[str]) -> Dict[str, float]:
+        """
+        Scores candidates by their exact inner product with the query.
+
+        Args:
+            query_embedding (np.ndarray): The L2-normalized query embedding.
+            ids (List[str]): The chunk ids of the candidates.
+
+        Returns:
+            Dict[str, float]: The score of each candidate found in the shadow;
+                ids missing from it are left out. For normalized embeddings
+                the score is the cosine similarity.
+        """
+        with self._lock:
+            known = [chunk_id for chunk_id in ids if chunk_id in self._rows]
+            if not known:
+                return {}
+            rows = np.fromiter((self._rows[chunk_id] for chunk_id in known), dtype=np.intp, count=len(known))
+            candidates = self._get_matrix()[rows].astype(np.float32)
+        scores = candidates @ np.asarray(query_embedding, dtype=np.float32).ravel()
+        return {chunk_id: float(score) for chunk_id, score in zip(known, scores)}
@@ -3,42 +3,159 @@
 This module manages the ChromaDB vector store. It handles the creation,
 storage, and querying of document embeddings.
 """
+import hashlib
 import logging
+import queue
+import sqlite3
+import threading
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable, Iterator, Set
 
 import chromadb
+import numpy as np
 
 from ingest.document_parser import extract_text_from_pdf
 from ingest.chunker import chunk_text
-from index.embedder import LocalEmbedder
+from index.embedder import get_embedder
+from index.embedding_cache import EmbeddingCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Number of chunks written to Chroma per `collection.add` call. Chroma commits
+# one transaction per call, and batches of ~100-250 amortize that overhead
+# without building huge single writes.
+ADD_BATCH_SIZE = 200
+
+# The embedder L2-normalizes every vector, so the inner-product distance
+# (1 - dot) equals the cosine distance and RELEVANCE_THRESHOLD still applies,
+# but hnswlib skips normalizing the vectors itself. Chroma cannot change the
+# space of an existing collection, so the default collection name is tied to it.
+DISTANCE_SPACE = "ip"
+DEFAULT_COLLECTION_NAME = f"rag_collection_{DISTANCE_SPACE}"
+
+# The cosine-space collection the default collection replaced. Stores that
+# still have it (such as the shipped index/chroma_db) are copied over once.
+LEGACY_COLLECTION_NAME = "rag_collection"
+
+# Chroma databases already switched to write-ahead logging by this process.
+# See `ChromaVectorStore._enable_wal`.
+_WAL_PATHS: Set[Path] = set()
+_WAL_LOCK = threading.Lock()
+
+# HNSW graph parameters. A denser graph (M) built with a wider beam
+# (construction_ef) keeps recall high at a search beam (search_ef) that is
+# still small for the k <= 5 lookups of a chat query. M and construction_ef
+# only apply when a collection is created.
+HNSW_M = 32
+HNSW_CONSTRUCTION_EF = 200
+HNSW_SEARCH_EF = 64
+
+# Number of chunks embedded per model call when chunks are streamed in.
+EMBED_BATCH_SIZE = 256
+
+# Maximum number of chunks buffered ahead of the embedder when chunks are
+# produced by a generator (e.g. straight from the PDF parser).
+PREFETCH_SIZE = 512
+
+class _EndOfStream:
+    """Marks the end of a prefetched stream, carrying the producer's error if any."""
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+def _prefetch(items: Iterable, maxsize: int) -> Iterator:
+    """
+    Consumes `items` on a background thread and yields its elements through a
+    bounded queue, so producing them (PDF parsing, OCR, splitting) overlaps
+    with the caller's work on earlier elements. The queue size bounds how far
+    the producer can run ahead. Errors raised by the producer are re-raised
+    in the caller.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        # Give up if the consumer went away, instead of blocking forever
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(_EndOfStream(e))
+        else:
+            put(_EndOfStream())
+
+    producer = threading.Thread(target=produce, name="chunk-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if isinstance(item, _EndOfStream):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+def _content_hash(text: str) -> str:
+    """
+    Returns the hash stored as a chunk's `content_hash`. Unlike the embedding
+    cache's keys it does not depend on the model, so the same text hashes the
+    same whichever embedder ingested it.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def _public_metadata(metadata: Dict[str, any]) -> Dict[str, any]:
+    """Drops the internal `content_hash` from a chunk's metadata for query results."""
+    return {key: value for key, value in metadata.items() if key != "content_hash"}
+
 class ChromaVectorStore:
     """Manages the ChromaDB vector store for the RAG system."""
 
-    def __init__(self, db_path: str, collection_name: str = "rag_collection"):
+    def __init__(self, db_path: str, collection_name: str = DEFAULT_COLLECTION_NAME,
+                 hnsw_m: int = HNSW_M, hnsw_construction_ef: int = HNSW_CONSTRUCTION_EF,
+                 hnsw_search_ef: int = HNSW_SEARCH_EF, dedup: bool = False):
         """
         Initializes the vector store.
 
         Args:
             db_path (str): Path to the directory where the DB will be persisted.
             collection_name (str): Name of the collection to store vectors in.
+            hnsw_m (int): The number of neighbors per node in the HNSW graph.
+            hnsw_construction_ef (int): The candidate list size when inserting.
+            hnsw_search_ef (int): The candidate list size when querying. Lower
+                values are faster at the cost of recall.
+            dedup (bool): If True, chunks whose text exactly matches a stored
+                chunk, or an earlier chunk in the same batch, are not added.
         """
         self.db_path = db_path
+        self.dedup = dedup
         self.collection_name = collection_name
-        self.embedder = LocalEmbedder()
+        self.embedder = get_embedder()
 
+        self._enable_wal()
         try:
             # Use a persistent client to save data to disk
             self.client = chromadb.PersistentClient(path=self.db_path)
             self.collection = self.client.get_or_create_collection(
                 name=self.collection_name,
-                # Langchain's Chroma wrapper uses this SentenceTransformerEmbeddingFunction
-                # by default, so we match it for compatibility.
-                metadata={"hnsw:space": "cosine"} 
+                metadata={
+                    "hnsw:space": DISTANCE_SPACE,
+                    "hnsw:M": hnsw_m,
+                    "hnsw:construction_ef": hnsw_construction_ef,
+                    "hnsw:search_ef": hnsw_search_ef,
+                }
             )
             logging.info(f"ChromaDB client initialized at '{db_path}'.")
             logging.info(f"Collection '{self.collection_name}' loaded/created.")
@@ -46,64 +163,270 @@ class ChromaVectorStore:
             logging.error(f"Failed to initialize ChromaDB client. Error: {e}")
             raise
 
-    def add_documents(self, chunks: List[Dict[str, any]]):
+        self.add_batch_size = min(ADD_BATCH_SIZE, self.client.get_max_batch_size())
+        if self.collection_name == DEFAULT_COLLECTION_NAME:
+            self._migrate_legacy_collection()
+        self.embedding_cache = EmbeddingCache(
+            Path(self.db_path) / "embedding_cache.sqlite3", self.embedder.cache_namespace
+        )
+        # Source documents in the collection, loaded on first use by
+        # `list_sources` and kept up to date as chunks are added
+        self._sources: Optional[Set[str]] = None
+        self._sources_lock = threading.Lock()
+
+    def _enable_wal(self):
+        """
+        Switches Chroma's SQLite database to write-ahead logging, so each
+        committed batch appends to the log instead of rewriting a rollback
+        journal. The journal mode is stored in the database file, so it also
+        applies to the connections Chroma itself opens.
+
+        This runs before Chroma opens the database, and at most once per path
+        per process: closing a second SQLite connection to a WAL database that
+        Chroma holds open removes the log from under it, and Chroma's next
+        write fails with a disk I/O error.
         """
-        Embeds and adds a list of document chunks to the vector store.
+        sqlite_path = Path(self.db_path).resolve() / "chroma.sqlite3"
+        with _WAL_LOCK:
+            if sqlite_path in _WAL_PATHS:
+                return
+            _WAL_PATHS.add(sqlite_path)
+        try:
+            sqlite_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(sqlite_path)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not enable WAL mode on '{sqlite_path}'. Error: {e}")
+
+    def _migrate_legacy_collection(self):
+        """
+        Copies the chunks of the legacy cosine-space collection into the
+        default collection while the latter is still empty. The stored vectors
+        are L2-normalized on the way, so their inner-product distances equal
+        the cosine distances they had; nothing is re-embedded, and the legacy
+        collection is left in place.
+        """
+        if self.collection.count() > 0:
+            return
+        try:
+            legacy = self.client.get_collection(LEGACY_COLLECTION_NAME)
+        except Exception:
+            # No legacy collection (Chroma's exception type varies by version)
+            return
+        total = legacy.count()
+        if total == 0:
+            return
+
+        # Copied chunks keep their ids and sources, so re-ingesting on top of
+        # them can skip or duplicate chunks; a rebuild starts from an empty store
+        rebuild_hint = (f"To embed the documents with the current model, delete '{self.db_path}' "
+                        "and ingest the source PDFs again.")
+        logging.info(f"Copying {total} chunks from the legacy collection '{LEGACY_COLLECTION_NAME}' "
+                     f"into '{self.collection_name}'...")
+        try:
+            for offset in range(0, total, self.add_batch_size):
+                entries = legacy.get(
+                    limit=self.add_batch_size, offset=offset,
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                embeddings = np.asarray(entries["embeddings"], dtype=np.float32)
+                if embeddings.shape[1] != self.embedder.dimension:
+                    logging.warning(
+                        f"Legacy collection '{LEGACY_COLLECTION_NAME}' holds {embeddings.shape[1]}-dimensional "
+                        f"embeddings, but the embedder produces {self.embedder.dimension}. {rebuild_hint}"
+                    )
+                    return
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                embeddings /= np.maximum(norms, np.finfo(np.float32).tiny)
+                self.collection.add(
+                    ids=entries["ids"],
+                    embeddings=embeddings,
+                    documents=entries["documents"],
+                    metadatas=entries["metadatas"]
+                )
+            logging.info(f"Copied the legacy collection '{LEGACY_COLLECTION_NAME}'. {rebuild_hint}")
+        except Exception as e:
+            logging.error(f"Failed to copy the legacy collection '{LEGACY_COLLECTION_NAME}'. "
+                          f"{rebuild_hint} Error: {e}")
+
+    def add_documents(self, chunks: Iterable[Dict[str, any]], replace_source: Optional[str] = None) -> int:
+        """
+        Embeds and adds document chunks to the vector store.
+
+        Chunks are embedded and written in batches as they arrive, so a
+        generator (e.g. `iter_chunks` over `extract_text_from_pdf`) is
+        streamed: parsing runs ahead on a background thread while earlier
+        batches are embedded, and only one batch is held in memory.
 
         Args:
-            chunks (List[Dict[str, any]]): A list of chunk dictionaries.
+            chunks (Iterable[Dict[str, any]]): A list or iterable of chunk dictionaries.
+            replace_source (Optional[str]): If given, the stored chunks of this
+                source are deleted before the first new chunk is written, so
+                re-ingesting a revised document replaces it. Chunk ids are
+                derived from the source's name and page, so without this the
+                stored chunks would keep their ids and the new ones be skipped.
+
+        Returns:
+            int: The number of chunks added.
         """
-        if not chunks:
+        if not isinstance(chunks, (list, tuple)):
+            chunks = _prefetch(chunks, PREFETCH_SIZE)
+
+        added = 0
+        received = 0
+        chunks = iter(chunks)
+        while batch := list(islice(chunks, EMBED_BATCH_SIZE)):
+            received += len(batch)
+            # Deleted only once there is something to replace it with, so a
+            # document that fails to parse does not wipe its earlier version
+            if replace_source is not None:
+                self.delete_source(replace_source)
+                replace_source = None
+            added += self._add_batch(batch)
+
+        if received == 0:
             logging.warning("No chunks provided to add to the vector store.")
-            return
+        elif added == 0:
+            logging.info(f"All {received} chunks were already stored or skipped.")
+        return added
+
+    def _add_batch(self, chunks: List[Dict[str, any]]) -> int:
+        """Embeds one batch of chunks and writes it to Chroma. Returns the number added."""
+        # The content hash is stored with every chunk, so duplicates of it are
+        # found even if deduplication is only switched on later
+        hashes = [_content_hash(chunk["content"]) for chunk in chunks]
+        if self.dedup:
+            keep = self._find_new_chunks(hashes)
+            if len(keep) < len(chunks):
+                logging.info(f"Skipping {len(chunks) - len(keep)} duplicate chunks.")
+                chunks = [chunks[i] for i in keep]
+                hashes = [hashes[i] for i in keep]
+            if not chunks:
+                return 0
 
         ids = [chunk["chunk_id"] for chunk in chunks]
         contents = [chunk["content"] for chunk in chunks]
-        metadatas = [{"source": chunk["source"], "page": chunk["page_number"]} for chunk in chunks]
+        metadatas = [
+            {"source": chunk["source"], "page": chunk["page_number"], "content_hash": content_hash}
+            for chunk, content_hash in zip(chunks, hashes)
+        ]
 
         logging.info(f"Generating embeddings for {len(contents)} chunks...")
-        embeddings = self.embedder.embed_documents(contents)
+        embeddings = self.embedder.embed_documents(contents, cache=self.embedding_cache)
 
         logging.info(f"Adding {len(ids)} documents to collection '{self.collection_name}'...")
+        added = 0
         try:
-            self.collection.add(
-                embeddings=embeddings.tolist(), # ChromaDB expects lists
-                documents=contents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            for i in range(0, len(ids), self.add_batch_size):
+                batch_ids = ids[i:i + self.add_batch_size]
+                # Chroma ignores ids it already has, so only new ids are
+                # added and counted
+                existing = set(self.collection.get(ids=batch_ids, include=[])["ids"])
+                new = [j for j in range(i, i + len(batch_ids)) if ids[j] not in existing]
+                if not new:
+                    continue
+                new_ids = [ids[j] for j in new]
+                new_metadatas = [metadatas[j] for j in new]
+                self.collection.add(
+                    embeddings=embeddings[new], # ChromaDB accepts float32 arrays as-is
+                    documents=[contents[j] for j in new],
+                    metadatas=new_metadatas,
+                    ids=new_ids
+                )
+                with self._sources_lock:
+                    if self._sources is not None:
+                        self._sources.update(meta["source"] for meta in new_metadatas)
+                added += len(new_ids)
             logging.info("Successfully added documents to the vector store.")
         except Exception as e:
             logging.error(f"Failed to add documents to Chroma. Error: {e}")
+        return added
+
+    def _find_new_chunks(self, hashes: List[str]) -> List[int]:
+        """
+        Returns the indices of the chunks whose content hash is neither in an
+        earlier chunk of the batch nor in a stored chunk.
+        """
+        seen = set()
+        keep = []
+        for i, content_hash in enumerate(hashes):
+            if content_hash not in seen:
+                seen.add(content_hash)
+                keep.append(i)
+
+        if keep:
+            stored = self.collection.get(
+                where={"content_hash": {"$in": [hashes[i] for i in keep]}}, include=["metadatas"]
+            )
+            stored_hashes = {meta["content_hash"] for meta in stored["metadatas"] or []}
+            keep = [i for i in keep if hashes[i] not in stored_hashes]
+        return keep
+
+    def delete_source(self, source: str):
+        """Deletes every chunk of a source document from the store."""
+        logging.info(f"Deleting the stored chunks of '{source}'...")
+        self.collection.delete(where={"source": source})
+        with self._sources_lock:
+            if self._sources is not None:
+                self._sources.discard(source)
+
+    def list_sources(self) -> List[str]:
+        """
+        Returns the sorted, unique sources of the documents in the store.
+
+        The sources are read from the collection once, fetching only the
+        metadatas (not the documents or embeddings), and are then kept up to
+        date by `add_documents`.
+        """
+        with self._sources_lock:
+            if self._sources is None:
+                entries = self.collection.get(include=["metadatas"])
+                self._sources = {meta["source"] for meta in entries["metadatas"] or []}
+            return sorted(self._sources)
 
-    def query(self, query_text: str, k: int = 5) -> List[Dict[str, any]]:
+    def query(self, query_text: str, k: int = 5,
+              query_embedding: Optional[np.ndarray] = None,
+              max_distance: Optional[float] = None) -> List[Dict[str, any]]:
         """
         Queries the vector store for the top-k most similar documents.
 
         Args:
             query_text (str): The text to search for.
             k (int): The number of results to return.
+            query_embedding (Optional[np.ndarray]): A precomputed embedding of
+                `query_text`. If given, the query is not embedded again.
+            max_distance (Optional[float]): If given, results farther away
+                than this distance are dropped.
 
         Returns:
             List[Dict[str, any]]: A list of result dictionaries.
         """
         logging.info(f"Querying for '{query_text}'...")
-        query_embedding = self.embedder.embed_query(query_text).tolist()
+        if query_embedding is None:
+            query_embedding = self.embedder.embed_query(query_text)
 
+        query_embedding = query_embedding.astype(np.float32, copy=False)
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=query_embedding.reshape(1, -1),
             n_results=k
         )
 
         # Reformat the results for easier use
         formatted_results = []
         if results and results["documents"]:
-            for i, doc in enumerate(results["documents"][0]):
-                formatted_results.append({
-                    "content": doc,
-                    "metadata": results["metadatas"][0][i],
-                    "distance": results["distances"][0][i]
-                })
+            documents = results["documents"][0]
+            metadatas = results["metadatas"][0]
+            distances = results["distances"][0]
+            indices = range(len(documents))
+            if max_distance is not None:
+                indices = np.flatnonzero(np.asarray(distances) <= max_distance)
+            formatted_results = [
+                {"content": documents[i], "metadata": _public_metadata(metadatas[i]), "distance": distances[i]}
+                for i in indices
+            ]
         return formatted_results
 
 
@@ -4,54 +4,98 @@ A module for splitting text from documents into manageable chunks.
 This uses a recursive character splitter for semantic chunking.
 """
 import logging
-from typing import List, Dict, Generator
+from functools import lru_cache
+from typing import List, Dict, Generator, Iterable, Optional
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from ingest.document_parser import extract_text_from_pdf, Path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def chunk_text(documents: Generator[Dict[str, any], None, None],
-               chunk_size: int = 1000,
-               chunk_overlap: int = 200) -> List[Dict[str, any]]:
+# Chunk size and overlap, in characters. Retrieval is memory-bound: an HNSW
+# search walks the graph reading one embedding per visited node, so its cost
+# grows with the number of chunks, not with their length. ~1000 characters
+# (~250 tokens) keeps a passage self-contained, and a 10% overlap is enough
+# to keep sentences that straddle a boundary retrievable, where 20% only
+# added near-duplicate chunks.
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 100
+
+@lru_cache(maxsize=8)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Returns a shared splitter instance for the given chunking parameters."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        add_start_index=True, # This helps in locating the chunk in the original doc
+    )
+
+def iter_chunks(documents: Iterable[Dict[str, any]],
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+                source: Optional[str] = None) -> Generator[Dict[str, any], None, None]:
     """
-    Splits the text content of documents into smaller chunks.
+    Splits the text content of documents into smaller chunks, yielding each
+    chunk as soon as its page has been split. This lets ingestion stream
+    chunks into the vector store without holding the whole document.
 
     Args:
-        documents (Generator[Dict[str, any], None, None]): A generator of documents, 
+        documents (Iterable[Dict[str, any]]): An iterable of documents, 
             where each document is a dictionary with 'content', 'source', etc.
         chunk_size (int): The maximum size of each chunk (in characters).
         chunk_overlap (int): The number of characters to overlap between chunks.
+        source (Optional[str]): If given, recorded as the source of every chunk
+            (and used for the chunk ids) instead of each document's 'source'.
 
-    Returns:
-        List[Dict[str, any]]: A list of chunks, where each chunk is a
-        dictionary containing the chunked content and original metadata.
+    Yields:
+        Generator[Dict[str, any], None, None]: A generator of chunks, where each
+        chunk is a dictionary containing the chunked content and original metadata.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        add_start_index=True, # This helps in locating the chunk in the original doc
-    )
+    text_splitter = _get_text_splitter(chunk_size, chunk_overlap)
 
-    chunks_with_metadata = []
+    n_chunks = 0
     for doc in documents:
         # Split the content of the document
         chunks = text_splitter.split_text(doc["content"])
 
-        # Add metadata to each chunk
-        for i, chunk_text in enumerate(chunks):
-            chunks_with_metadata.append({
+        # Add metadata to each chunk; the per-page values are looked up once
+        doc_source = source or doc["source"]
+        page_number = doc["page_number"]
+        id_prefix = f"{Path(doc_source).stem}_p{page_number}_c"
+        for i, chunk_text in enumerate(chunks, 1):
+            yield {
                 "content": chunk_text,
-                "source": doc["source"],
-                "page_number": doc["page_number"],
-                "chunk_id": f"{Path(doc['source']).stem}_p{doc['page_number']}_c{i+1}"
-            })
+                "source": doc_source,
+                "page_number": page_number,
+                "chunk_id": f"{id_prefix}{i}"
+            }
+        n_chunks += len(chunks)
+
+    logging.info(f"Created {n_chunks} chunks.")
+
+def chunk_text(documents: Generator[Dict[str, any], None, None],
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+               source: Optional[str] = None) -> List[Dict[str, any]]:
+    """
+    Splits the text content of documents into smaller chunks.
+
+    Args:
+        documents (Generator[Dict[str, any], None, None]): A generator of documents, 
+            where each document is a dictionary with 'content', 'source', etc.
+        chunk_size (int): The maximum size of each chunk (in characters).
+        chunk_overlap (int): The number of characters to overlap between chunks.
+        source (Optional[str]): If given, recorded as the source of every chunk
+            instead of each document's 'source'.
 
-    logging.info(f"Created {len(chunks_with_metadata)} chunks.")
-    return chunks_with_metadata
+    Returns:
+        List[Dict[str, any]]: A list of chunks, where each chunk is a
+        dictionary containing the chunked content and original metadata.
+    """
+    return list(iter_chunks(documents, chunk_size, chunk_overlap, source))
 
 def main():
     """
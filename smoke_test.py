@@ -8,7 +8,7 @@ try:
     import fastapi
     import streamlit
     import sentence_transformers
-    import pypdf
+    import pymupdf
     import google.generativeai
 
     print("✅ All major libraries imported successfully!")
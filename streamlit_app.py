@@ -1,12 +1,28 @@
 import streamlit as st
-from pathlib import Path
+import io
+import os
+import runpy
 import tempfile
+import time
 import logging
+from pathlib import Path
+
+# --- Remote Backend ---
+# When RAG_API_URL points at a running API server (`uvicorn api.main:app`),
+# the index, embedding model and LLM client live in that process and this
+# script only runs the thin HTTP client in ui/app.py, so Streamlit reruns
+# never contend with embedding or ANN search and the index persists on disk.
+# Without it (e.g. on Streamlit Cloud) everything runs in-process below.
+if os.getenv("RAG_API_URL"):
+    runpy.run_path(str(Path(__file__).parent / "ui" / "app.py"), run_name="__main__")
+    st.stop()
 
 from ingest.document_parser import extract_text_from_pdf
-from ingest.chunker import chunk_text
+from ingest.chunker import iter_chunks
+from index.embedder import LocalEmbedder, get_embedder
 from index.vector_store import ChromaVectorStore
-from api.llm_integrator import GeminiIntegrator, RELEVANCE_THRESHOLD
+from api.llm_integrator import GeminiIntegrator, ERROR_ANSWER, RELEVANCE_THRESHOLD
+from api.cache import SemanticQueryCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,9 +35,35 @@ st.set_page_config(
 
 st.title("📚 RAG Knowledge Base Search Engine")
 
+# --- Shared Resources ---
+# st.cache_resource builds these once per server process and shares them
+# across reruns and sessions, so the embedding model and the LLM client are
+# loaded (and warmed up) before the first question instead of while the user
+# waits for it.
+
+@st.cache_resource
+def get_warm_embedder() -> LocalEmbedder:
+    """Loads the process-wide embedder and runs its first forward pass."""
+    embedder = get_embedder()
+    try:
+        embedder.embed_query("warmup")
+    except Exception as e:
+        logging.warning(f"Embedder warm-up failed: {e}")
+    return embedder
+
+@st.cache_resource
+def get_llm_integrator() -> GeminiIntegrator:
+    """Creates the Gemini client."""
+    llm_integrator = GeminiIntegrator()
+    logging.info("Initialized Gemini Integrator.")
+    return llm_integrator
+
 # --- Initialize Session State ---
-# We use session_state to hold the vector store and LLM integrator
-# so they persist across re-runs.
+# Each session keeps its own temporary vector store and answer cache, so
+# documents uploaded in one browser session are never searched (or cached
+# answers served) in another.
+
+embedder = get_warm_embedder()
 
 if "vector_store" not in st.session_state:
     # Use a temporary directory for the non-persistent ChromaDB
@@ -29,21 +71,40 @@ if "vector_store" not in st.session_state:
     st.session_state.vector_store = ChromaVectorStore(db_path=st.session_state.temp_dir)
     logging.info(f"Initialized non-persistent ChromaDB at {st.session_state.temp_dir}")
 
-if "llm_integrator" not in st.session_state:
-    try:
-        st.session_state.llm_integrator = GeminiIntegrator()
-        logging.info("Initialized Gemini Integrator.")
-    except Exception as e:
-        st.error(f"Failed to initialize LLM: {e}")
-        logging.error(f"Failed to initialize LLM: {e}")
-        st.stop()
+if "query_cache" not in st.session_state:
+    # Answers repeated and paraphrased questions
+    st.session_state.query_cache = SemanticQueryCache(maxsize=512, dim=embedder.dimension)
+
+vector_store = st.session_state.vector_store
+query_cache = st.session_state.query_cache
+try:
+    llm_integrator = get_llm_integrator()
+except Exception as e:
+    st.error(f"Failed to initialize LLM: {e}")
+    logging.error(f"Failed to initialize LLM: {e}")
+    st.stop()
 
 # --- Helper Functions (re-implementing API logic directly) ---
 
+# Streamlit reruns the whole script on every interaction, so the sidebar's
+# chunk count is reused for this many seconds instead of queried each rerun.
+# The document list is already kept in memory by the vector store.
+SIDEBAR_TTL = 10
+
+@st.cache_data(ttl=SIDEBAR_TTL, show_spinner=False)
+def count_chunks(db_path: str, _vector_store: ChromaVectorStore) -> int:
+    """
+    Returns the number of chunks in a session's store, reusing the count
+    across reruns for up to SIDEBAR_TTL seconds. The cache is keyed by the
+    store's `db_path` (the store itself is not hashed), so sessions never see
+    each other's counts. Errors raise, so they are not cached.
+    """
+    return _vector_store.collection.count()
+
 def get_status():
     """Gets the status of the vector store."""
     try:
-        count = st.session_state.vector_store.collection.count()
+        count = count_chunks(vector_store.db_path, vector_store)
         return {"status": "ok", "indexed_chunks": count}
     except Exception as e:
         logging.error(f"Vector store connection failed: {e}")
@@ -52,12 +113,7 @@ def get_status():
 def get_ingested_docs():
     """Gets a list of ingested document sources."""
     try:
-        all_entries = st.session_state.vector_store.collection.get()
-        if not all_entries or not all_entries['metadatas']:
-            return []
-        
-        unique_sources = sorted(list(set(meta['source'] for meta in all_entries['metadatas'])))
-        return unique_sources
+        return vector_store.list_sources()
     except Exception as e:
         logging.error(f"Failed to retrieve documents: {e}")
         return []
@@ -65,38 +121,72 @@ def get_ingested_docs():
 def handle_ingestion(uploaded_file):
     """Handles the file upload and ingestion process."""
     if uploaded_file is not None:
-        # Save to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.getbuffer())
-            file_path = Path(tmp_file.name)
-        
         st.info(f"Ingesting '{uploaded_file.name}'...")
         
         try:
-            doc_generator = extract_text_from_pdf(file_path)
-            chunks = chunk_text(doc_generator)
-            
-            # Use the actual filename as the 'source' metadata
-            for chunk in chunks:
-                chunk['source'] = uploaded_file.name
-
-            st.session_state.vector_store.add_documents(chunks)
-            st.success(f"Successfully ingested '{uploaded_file.name}' ({len(chunks)} chunks added).")
+            # Parse the upload straight from memory, using the actual filename
+            # as the 'source' metadata
+            doc_generator = extract_text_from_pdf(
+                io.BytesIO(uploaded_file.getbuffer()), source=uploaded_file.name
+            )
+
+            # Parsing and chunking run ahead on a background thread while
+            # earlier batches are embedded and written, so the stages overlap
+            # and only a bounded number of chunks is held in memory.
+            # A file uploaded again under the same name replaces its chunks
+            chunks_added = vector_store.add_documents(
+                iter_chunks(doc_generator), replace_source=uploaded_file.name
+            )
+            # Cached answers and counts are stale now that the knowledge base changed
+            query_cache.clear()
+            count_chunks.clear()
+            st.success(f"Successfully ingested '{uploaded_file.name}' ({chunks_added} chunks added).")
         except Exception as e:
             st.error(f"Ingestion failed: {e}")
             logging.error(f"Ingestion failed for {uploaded_file.name}. Error: {e}")
-        finally:
-            # Clean up the temporary file
-            file_path.unlink()
 
-def handle_query(query, top_k=3):
-    """Handles the query process."""
+def _stream_and_cache(query, query_embedding, top_k, retrieved_chunks, start):
+    """Yields the LLM answer as it is generated and caches it once complete."""
+    pieces = []
+    for piece in llm_integrator.generate_answer_stream(query, retrieved_chunks):
+        pieces.append(piece)
+        yield piece
+    # A failed stream ends with ERROR_ANSWER after any partial text
+    if pieces and pieces[-1] != ERROR_ANSWER:
+        query_cache.put(
+            query, query_embedding, top_k,
+            (retrieved_chunks, "".join(pieces)), cost=time.perf_counter() - start
+        )
+
+def _cached_or_embedding(query, top_k):
+    """
+    Looks the query up in the cache, first by its exact text and then by the
+    similarity of its embedding. Returns the cached (chunks, answer) pair, or
+    None on a miss, together with the query embedding (None on an exact hit).
+    """
+    cached = query_cache.get(query, top_k)
+    if cached is not None:
+        return cached, None
+    query_embedding = vector_store.embedder.embed_query(query)
+    return query_cache.get_similar(query_embedding, top_k), query_embedding
+
+def handle_query(query, top_k=2):
+    """
+    Handles the query process. Returns the retrieved chunks and an iterator
+    over the pieces of the answer, so the answer can be shown as it streams in.
+    """
     try:
-        retrieved_chunks = st.session_state.vector_store.query(query, k=top_k)
-        llm_answer = st.session_state.llm_integrator.generate_answer(query, retrieved_chunks)
-        
+        # Serve repeated or paraphrased queries from the cache. The query is
+        # embedded once and the embedding is reused for retrieval.
+        cached, query_embedding = _cached_or_embedding(query, top_k)
+        if cached is not None:
+            retrieved_chunks, llm_answer = cached
+            return {"answer_stream": iter([llm_answer]), "retrieved_chunks": retrieved_chunks}
+
+        start = time.perf_counter()
+        retrieved_chunks = vector_store.query(query, top_k, query_embedding, RELEVANCE_THRESHOLD)
         return {
-            "llm_answer": llm_answer,
+            "answer_stream": _stream_and_cache(query, query_embedding, top_k, retrieved_chunks, start),
             "retrieved_chunks": retrieved_chunks
         }
     except Exception as e:
@@ -134,47 +224,60 @@ with st.sidebar:
             for doc_name in docs:
                 st.write(f"- `{doc_name}`")
         else:
-            st.write("No documents ingested in this session.")
+            st.write("No documents ingested yet.")
 
 # --- Main Chat Interface ---
 st.header("Ask a Question")
 
-# Initialize chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+# The chat runs as a fragment: sending a message reruns only this function,
+# not the whole script, so the sidebar (uploader, status, document list) is
+# not rebuilt on every turn.
+@st.fragment
+def chat():
+    """Renders the chat history and answers new questions."""
+    # Initialize chat history
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
 
-# Display chat messages from history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+    # Display chat messages from history
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
 
-# React to user input
-if prompt := st.chat_input("What would you like to know?"):
-    st.chat_message("user").markdown(prompt)
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    # React to user input
+    if prompt := st.chat_input("What would you like to know?"):
+        st.chat_message("user").markdown(prompt)
+        st.session_state.messages.append({"role": "user", "content": prompt})
 
-    # Get assistant response
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        
-        result = handle_query(prompt)
-        
-        if result:
-            llm_answer = result.get("llm_answer", "Sorry, I couldn't generate an answer.")
-            message_placeholder.markdown(llm_answer)
-            
-            # Display retrieved chunks in an expander
-            with st.expander("Show Retrieved Context"):
-                for i, chunk in enumerate(result.get("retrieved_chunks", [])):
-                    source_name = chunk['metadata'].get('source', 'Unknown')
-                    page_num = chunk['metadata'].get('page', 'N/A')
-                    st.info(
-                        f"**Chunk {i+1}** (Source: {source_name}, "
-                        f"Page: {page_num}, "
-                        f"Distance: {chunk['distance']:.4f})\n\n"
-                        f"> {chunk['content']}"
-                    )
-            
-            st.session_state.messages.append({"role": "assistant", "content": llm_answer})
-        else:
-            message_placeholder.error("Failed to get a response from the RAG system.")
+        # Get assistant response
+        with st.chat_message("assistant"):
+            message_placeholder = st.empty()
+
+            result = handle_query(prompt)
+
+            if result:
+                # Show the answer as it streams in, with a cursor until it is complete
+                llm_answer = ""
+                for piece in result["answer_stream"]:
+                    llm_answer += piece
+                    message_placeholder.markdown(llm_answer + "▌")
+                llm_answer = llm_answer or "Sorry, I couldn't generate an answer."
+                message_placeholder.markdown(llm_answer)
+
+                # Display retrieved chunks in an expander
+                with st.expander("Show Retrieved Context"):
+                    for i, chunk in enumerate(result.get("retrieved_chunks", [])):
+                        source_name = chunk['metadata'].get('source', 'Unknown')
+                        page_num = chunk['metadata'].get('page', 'N/A')
+                        st.info(
+                            f"**Chunk {i+1}** (Source: {source_name}, "
+                            f"Page: {page_num}, "
+                            f"Distance: {chunk['distance']:.4f})\n\n"
+                            f"> {chunk['content']}"
+                        )
+
+                st.session_state.messages.append({"role": "assistant", "content": llm_answer})
+            else:
+                message_placeholder.error("Failed to get a response from the RAG system.")
+
+chat()
@@ -0,0 +1,48 @@
+# tests/test_cache.py
+"""
+Unit tests for the semantic query cache.
+"""
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from api.cache import SemanticQueryCache
+
+def _result(answer):
+    return [{"content": "The sky is blue.", "metadata": {}, "distance": 0.1}], answer
+
+def test_exact_and_semantic_hits():
+    """
+    Tests that a cached query is found by its normalized text and by a
+    nearby embedding, but not by a dissimilar one.
+    """
+    cache = SemanticQueryCache(maxsize=4, dim=3)
+    cache.put("What color is the sky?", np.array([1.0, 0.0, 0.0]), 3, _result("Blue."), cost=1.0)
+
+    # Exact hits ignore case and surrounding whitespace
+    assert cache.get("  what color is the SKY? ", 3)[1] == "Blue."
+    assert cache.get("What color is the sky?", 5) is None
+
+    # Semantic hits depend on the cosine similarity of the embeddings
+    assert cache.get_similar(np.array([2.0, 0.1, 0.0]), 3)[1] == "Blue."
+    assert cache.get_similar(np.array([0.0, 1.0, 0.0]), 3) is None
+
+def test_gdsf_eviction():
+    """
+    Tests that a full cache evicts the entry with the lowest frequency * cost / size.
+    """
+    cache = SemanticQueryCache(maxsize=2, dim=3)
+    cache.put("cheap", np.array([1.0, 0.0, 0.0]), 3, _result("A"), cost=0.1)
+    cache.put("expensive", np.array([0.0, 1.0, 0.0]), 3, _result("B"), cost=5.0)
+    cache.put("new", np.array([0.0, 0.0, 1.0]), 3, _result("C"), cost=1.0)
+
+    assert len(cache) == 2
+    assert cache.get("cheap", 3) is None
+    assert cache.get("expensive", 3)[1] == "B"
+    # The embedding of the evicted entry must not produce semantic hits
+    assert cache.get_similar(np.array([1.0, 0.0, 0.0]), 3) is None
+    assert cache.get_similar(np.array([0.0, 0.0, 1.0]), 3)[1] == "C"
@@ -9,7 +9,7 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from ingest.chunker import chunk_text
+from ingest.chunker import chunk_text, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
 
 def test_chunk_text():
     """
@@ -41,4 +41,36 @@ def test_chunk_text():
     assert first_chunk["chunk_id"] == "dummy_source_p1_c1"
 
     # Assert that the content is smaller than the chunk size
-    assert len(first_chunk["content"]) <= 150
\ No newline at end of file
+    assert len(first_chunk["content"]) <= 150
+
+def test_chunk_text_source_override():
+    """
+    Tests that an explicit source replaces each document's source in the
+    chunk metadata and ids.
+    """
+    dummy_documents = [{"content": "Short text.", "source": "/tmp/tmpab12cd.pdf", "page_number": 2}]
+
+    chunks = chunk_text(dummy_documents, source="report.pdf")
+
+    assert chunks[0]["source"] == "report.pdf"
+    assert chunks[0]["chunk_id"] == "report_p2_c1"
+
+def test_chunk_text_defaults():
+    """
+    Tests that the default chunking parameters bound the chunk size and that
+    consecutive chunks overlap by at most DEFAULT_CHUNK_OVERLAP characters.
+    """
+    # Numbered sentences, so no chunk boundary lines up with a repeat of the text
+    content = " ".join(f"This is test sentence number {i}." for i in range(200))
+    dummy_documents = [{"content": content, "source": "dummy_source.pdf", "page_number": 1}]
+
+    chunks = [chunk["content"] for chunk in chunk_text(dummy_documents)]
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= DEFAULT_CHUNK_SIZE for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        overlap = max(
+            (k for k in range(1, min(len(previous), len(current)) + 1) if previous[-k:] == current[:k]),
+            default=0
+        )
+        assert 0 < overlap <= DEFAULT_CHUNK_OVERLAP
@@ -0,0 +1,33 @@
+# tests/test_embedder.py
+"""
+Unit tests for the query embedding batcher.
+"""
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from index.embedder import QueryEmbeddingBatcher
+
+class _FakeEmbedder:
+    """Embeds each query as a vector holding its length."""
+    def embed_queries(self, texts):
+        return np.array([[float(len(text))] for text in texts])
+
+def test_cancelled_query_is_skipped():
+    """
+    Tests that a query cancelled while queued is dropped and does not stop
+    the batcher from answering later queries.
+    """
+    batcher = QueryEmbeddingBatcher(_FakeEmbedder())
+    cancelled = batcher.submit("dropped")
+    assert cancelled.cancel()
+
+    batcher.start()
+    try:
+        assert batcher.submit("four").result(timeout=5)[0] == 4.0
+    finally:
+        batcher.stop()
@@ -0,0 +1,33 @@
+# tests/test_embedding_cache.py
+"""
+Unit tests for the persistent embedding cache.
+"""
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from index.embedding_cache import EmbeddingCache
+
+def test_set_and_get_many(tmp_path):
+    """
+    Tests that stored embeddings are found again, also after reopening the
+    cache, and that keys depend on both the text and the namespace.
+    """
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", namespace="model-a")
+    keys = cache.make_keys(["The sky is blue.", "The grass is green."])
+    vectors = np.array([[0.6, 0.8], [1.0, 0.0]], dtype=np.float32)
+    cache.set_many(zip(keys, vectors))
+    cache.close()
+
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", namespace="model-a")
+    found = cache.get_many(cache.make_keys(["The grass is green.", "Unseen text."]))
+    assert len(found) == 1
+    np.testing.assert_array_equal(found[keys[1]], vectors[1])
+
+    # The same text embedded by another model must not hit
+    other = EmbeddingCache(tmp_path / "cache.sqlite3", namespace="model-b")
+    assert other.get_many(other.make_keys(["The sky is blue."])) == {}
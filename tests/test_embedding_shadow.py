@@ -0,0 +1,44 @@
+# tests/test_embedding_shadow.py
+"""
+Unit tests for the memory-mapped embedding shadow.
+"""
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pytest
+from index.embedding_shadow import EmbeddingShadow
+
+def test_append_and_score(tmp_path):
+    """
+    Tests that candidates are scored by their inner product with the query,
+    also after reopening the shadow, and that unknown ids are left out.
+    """
+    shadow = EmbeddingShadow(tmp_path, dim=2)
+    shadow.append(["a", "b"], np.array([[1.0, 0.0], [0.0, 1.0]]))
+    shadow.append(["c"], np.array([[0.6, 0.8]]))
+
+    shadow = EmbeddingShadow(tmp_path, dim=2)
+    assert len(shadow) == 3
+    scores = shadow.score(np.array([0.0, 1.0]), ["a", "b", "c", "missing"])
+    assert sorted(scores) == ["a", "b", "c"]
+    assert scores["b"] == pytest.approx(1.0)
+    assert scores["c"] == pytest.approx(0.8)
+
+def test_truncates_incomplete_rows(tmp_path):
+    """
+    Tests that rows without a matching id, e.g. from an interrupted append,
+    are dropped when the shadow is opened.
+    """
+    shadow = EmbeddingShadow(tmp_path, dim=2)
+    shadow.append(["a"], np.array([[1.0, 0.0]]))
+    with open(shadow.vectors_path, "ab") as f:
+        f.write(np.array([0.0, 1.0], dtype=np.float32).tobytes())
+
+    shadow = EmbeddingShadow(tmp_path, dim=2)
+    assert len(shadow) == 1
+    assert shadow.vectors_path.stat().st_size == 2 * 4
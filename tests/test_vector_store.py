@@ -11,8 +11,11 @@ import shutil
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+import chromadb
+import numpy as np
 import pytest
-from index.vector_store import ChromaVectorStore
+from index.vector_store import ChromaVectorStore, LEGACY_COLLECTION_NAME
+from index.embedder import get_embedder
 
 @pytest.fixture
 def temp_db():
@@ -41,6 +44,7 @@ def test_add_and_query(temp_db):
 
     # Assert that the number of items in the collection is correct
     assert vector_store.collection.count() == 2
+    assert vector_store.list_sources() == ["doc1.pdf"]
 
     # Query for a similar sentence
     query_text = "What color is the sky?"
@@ -50,4 +54,101 @@ def test_add_and_query(temp_db):
     assert len(results) == 1
 
     # Assert that the most relevant result is the correct one
-    assert "The sky is blue" in results[0]["content"]
\ No newline at end of file
+    assert "The sky is blue" in results[0]["content"]
+
+    # Embeddings are normalized, so distances lie in the cosine range [0, 2]
+    assert 0.0 <= results[0]["distance"] <= 2.0
+
+    # Internal bookkeeping stays out of the results
+    assert results[0]["metadata"] == {"source": "doc1.pdf", "page": 1}
+
+def test_reopened_store_accepts_writes(temp_db):
+    """
+    Tests that a second store opened on the same database, here for another
+    collection, can still add chunks.
+    """
+    ChromaVectorStore(db_path=temp_db, collection_name="other_collection").add_documents([
+        {"chunk_id": "doc1_c1", "content": "The sky is blue.", "source": "doc1.pdf", "page_number": 1}
+    ])
+
+    vector_store = ChromaVectorStore(db_path=temp_db)
+    added = vector_store.add_documents([
+        {"chunk_id": "doc1_c2", "content": "The grass is green.", "source": "doc1.pdf", "page_number": 1}
+    ])
+
+    assert added == 1
+    assert vector_store.collection.count() == 1
+
+def test_reingest_replaces_source(temp_db):
+    """
+    Tests that re-ingesting a source replaces its stored chunks, even when
+    the new chunks reuse their ids.
+    """
+    vector_store = ChromaVectorStore(db_path=temp_db)
+    vector_store.add_documents([
+        {"chunk_id": "report_p1_c1", "content": "The sky is blue.", "source": "report.pdf", "page_number": 1},
+        {"chunk_id": "report_p2_c1", "content": "The grass is green.", "source": "report.pdf", "page_number": 2}
+    ])
+
+    added = vector_store.add_documents([
+        {"chunk_id": "report_p1_c1", "content": "The sky is grey.", "source": "report.pdf", "page_number": 1}
+    ], replace_source="report.pdf")
+
+    assert added == 1
+    assert vector_store.collection.get()["documents"] == ["The sky is grey."]
+    assert vector_store.list_sources() == ["report.pdf"]
+
+def test_readding_ids_adds_nothing(temp_db):
+    """
+    Tests that re-adding a stored chunk id is not counted as an added chunk.
+    """
+    vector_store = ChromaVectorStore(db_path=temp_db)
+    chunk = {"chunk_id": "doc1_c1", "content": "The sky is blue.", "source": "doc1.pdf", "page_number": 1}
+
+    assert vector_store.add_documents([chunk]) == 1
+    assert vector_store.add_documents([chunk]) == 0
+    assert vector_store.collection.count() == 1
+
+def test_skips_duplicate_chunks(temp_db):
+    """
+    Tests that, with deduplication on, chunks whose text matches a stored
+    chunk, or an earlier chunk in the same batch, are not added again.
+    """
+    vector_store = ChromaVectorStore(db_path=temp_db, dedup=True)
+    vector_store.add_documents([
+        {"chunk_id": "doc1_c1", "content": "The sky is blue.", "source": "doc1.pdf", "page_number": 1}
+    ])
+
+    added = vector_store.add_documents([
+        {"chunk_id": "doc2_c1", "content": "The sky is blue.", "source": "doc2.pdf", "page_number": 1},
+        {"chunk_id": "doc2_c2", "content": "Grass is green.", "source": "doc2.pdf", "page_number": 1},
+        {"chunk_id": "doc2_c3", "content": "Grass is green.", "source": "doc2.pdf", "page_number": 2},
+        # Only exact matches are skipped
+        {"chunk_id": "doc2_c4", "content": "The sky is blue!", "source": "doc2.pdf", "page_number": 2}
+    ])
+
+    assert added == 2
+    assert vector_store.collection.count() == 3
+
+def test_copies_legacy_collection(temp_db):
+    """
+    Tests that chunks of a legacy cosine-space collection are copied into the
+    default collection with normalized embeddings.
+    """
+    dimension = get_embedder().dimension
+    legacy = chromadb.PersistentClient(path=temp_db).create_collection(
+        LEGACY_COLLECTION_NAME, metadata={"hnsw:space": "cosine"}
+    )
+    legacy.add(
+        ids=["doc1_p1_c1"],
+        embeddings=np.full((1, dimension), 3.0, dtype=np.float32),
+        documents=["The sky is blue."],
+        metadatas=[{"source": "doc1.pdf", "page": 1}]
+    )
+
+    vector_store = ChromaVectorStore(db_path=temp_db)
+
+    assert vector_store.collection.count() == 1
+    assert vector_store.list_sources() == ["doc1.pdf"]
+    stored = vector_store.collection.get(include=["embeddings"])["embeddings"]
+    assert np.linalg.norm(stored[0]) == pytest.approx(1.0, abs=1e-5)
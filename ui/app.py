@@ -7,64 +7,122 @@ This module provides an interface for users to:
 - View the list of ingested documents.
 - Ask questions and receive answers based on the knowledge base.
 """
+import os
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+import json
 import time
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # --- Configuration ---
-API_URL = "http://127.0.0.1:8000"
-DATA_DIR = Path(__file__).parent.parent / "data"
+API_URL = os.getenv("RAG_API_URL", "http://127.0.0.1:8000")
 
-# Create the data directory if it doesn't exist
-DATA_DIR.mkdir(exist_ok=True)
+# Streamlit reruns the whole script on every interaction, so the sidebar's
+# status and document list are reused for this many seconds instead of being
+# fetched from the API on each rerun.
+SIDEBAR_TTL = 10
 
 # --- Helper Functions to Interact with API ---
 
+def json_loads(data):
+    """Parses JSON with orjson when it is installed, else the json module."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def json_body(payload) -> dict:
+    """Returns the request arguments that send `payload` as a JSON body."""
+    if orjson is None:
+        return {"json": payload}
+    return {"data": orjson.dumps(payload), "headers": {"Content-Type": "application/json"}}
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    Returns a pooled HTTP session to the API, shared across reruns and
+    sessions, so calls reuse open connections instead of reconnecting.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+    session.mount(API_URL, adapter)
+    return session
+
+# Endpoints shown in the sidebar. They are independent, so they are fetched
+# concurrently and a refresh costs one round trip instead of two.
+SIDEBAR_ENDPOINTS = ("/status", "/list-docs")
+
+@st.cache_data(ttl=SIDEBAR_TTL, show_spinner=False)
+def fetch_sidebar_data():
+    """
+    Fetches and caches the JSON responses of the sidebar endpoints, keyed by
+    endpoint. Failed requests raise, so errors are not cached.
+    """
+    session = get_session()
+
+    def fetch(endpoint):
+        response = session.get(f"{API_URL}{endpoint}")
+        response.raise_for_status()
+        return json_loads(response.content)
+
+    with ThreadPoolExecutor(max_workers=len(SIDEBAR_ENDPOINTS)) as pool:
+        futures = {endpoint: pool.submit(fetch, endpoint) for endpoint in SIDEBAR_ENDPOINTS}
+    return {endpoint: future.result() for endpoint, future in futures.items()}
+
 def get_status():
     """Fetches status from the backend."""
     try:
-        response = requests.get(f"{API_URL}/status")
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return fetch_sidebar_data()["/status"]
+    # orjson's and json's decode errors are both ValueErrors
+    except (requests.exceptions.RequestException, ValueError) as e:
         st.error(f"Error connecting to API: {e}")
         return None
 
 def get_ingested_docs():
     """Fetches the list of ingested documents."""
     try:
-        response = requests.get(f"{API_URL}/list-docs")
-        response.raise_for_status()
-        return response.json().get("documents", [])
-    except requests.exceptions.RequestException as e:
+        return fetch_sidebar_data()["/list-docs"].get("documents", [])
+    # orjson's and json's decode errors are both ValueErrors
+    except (requests.exceptions.RequestException, ValueError) as e:
         st.error(f"Could not fetch document list: {e}")
         return []
 
 def handle_ingestion(uploaded_file):
     """Handles the file upload and ingestion process."""
     if uploaded_file is not None:
-        # Save the file to the data directory
-        file_path = DATA_DIR / uploaded_file.name
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
         st.info(f"Uploading '{uploaded_file.name}' for ingestion...")
 
         try:
-            # Call the /ingest endpoint
-            response = requests.post(
-                f"{API_URL}/ingest",
-                json={"file_path": str(file_path)}
+            # Send the file to the /ingest/upload endpoint straight from memory
+            response = get_session().post(
+                f"{API_URL}/ingest/upload",
+                files={"file": (uploaded_file.name, uploaded_file.getvalue(), "application/pdf")}
             )
             response.raise_for_status()
-            result = response.json()
+            result = json_loads(response.content)
+            # The status and document list changed
+            fetch_sidebar_data.clear()
             st.success(f"Successfully ingested '{result['file_path']}' ({result['chunks_added']} chunks added).")
         except requests.exceptions.RequestException as e:
             st.error(f"Ingestion failed: {e}")
         except Exception as e:
             st.error(f"An unexpected error occurred: {e}")
 
+def iter_sse_events(response):
+    """Yields the (event, data) pairs of a server-sent event stream."""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and data:
+            yield event, json_loads("\n".join(data))
+            event, data = "message", []
+
 # --- Streamlit UI ---
 
 st.set_page_config(page_title="RAG Search Engine", layout="wide")
@@ -106,56 +164,73 @@ with st.sidebar:
 # --- Main Chat Interface ---
 st.header("Ask a Question")
 
-# Initialize chat history
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-# Display chat messages from history on app rerun
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# React to user input
-if prompt := st.chat_input("What would you like to know?"):
-    # Display user message in chat message container
-    st.chat_message("user").markdown(prompt)
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
-
-    # Get assistant response
-    with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        full_response = ""
-
-        try:
-            # Call the /query endpoint
-            response = requests.post(
-                f"{API_URL}/query",
-                json={"query": prompt, "top_k": 3}
-            )
-            response.raise_for_status()
-            result = response.json()
-
-            # Display LLM answer
-            llm_answer = result.get("llm_answer", "Sorry, I couldn't generate an answer.")
-            message_placeholder.markdown(llm_answer)
-
-            # Display retrieved chunks in an expander
-            with st.expander("Show Retrieved Context"):
-                for i, chunk in enumerate(result.get("retrieved_chunks", [])):
-                    source_name = Path(chunk['metadata']['source']).name
-                    st.info(
-                        f"**Chunk {i+1}** (Source: {source_name}, "
-                        f"Page: {chunk['metadata']['page']}, "
-                        f"Distance: {chunk['distance']:.4f})\n\n"
-                        f"> {chunk['content']}"
-                    )
-
-        except requests.exceptions.RequestException as e:
-            message_placeholder.error(f"Failed to get answer: {e}")
-        except Exception as e:
-            message_placeholder.error(f"An unexpected error occurred: {e}")
-
-    # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": llm_answer})
-    
\ No newline at end of file
+# The chat runs as a fragment: sending a message reruns only this function,
+# not the whole script, so the sidebar (uploader, status, document list) is
+# not rebuilt on every turn.
+@st.fragment
+def chat():
+    """Renders the chat history and answers new questions."""
+    # Initialize chat history
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+
+    # Display chat messages from history on app rerun
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # React to user input
+    if prompt := st.chat_input("What would you like to know?"):
+        # Display user message in chat message container
+        st.chat_message("user").markdown(prompt)
+        # Add user message to chat history
+        st.session_state.messages.append({"role": "user", "content": prompt})
+
+        # Get assistant response
+        with st.chat_message("assistant"):
+            message_placeholder = st.empty()
+            full_response = ""
+
+            try:
+                # Stream the answer from the /query/stream endpoint
+                with get_session().post(
+                    f"{API_URL}/query/stream",
+                    **json_body({"query": prompt, "top_k": 2}),
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    retrieved_chunks = []
+                    for event, data in iter_sse_events(response):
+                        if event == "chunks":
+                            retrieved_chunks = data
+                        elif event == "token":
+                            full_response += data
+                            message_placeholder.markdown(full_response + "▌")
+                        elif event == "error":
+                            raise RuntimeError(data.get("detail", "Unknown error"))
+
+                # Display LLM answer
+                if not full_response:
+                    full_response = "Sorry, I couldn't generate an answer."
+                message_placeholder.markdown(full_response)
+
+                # Display retrieved chunks in an expander
+                with st.expander("Show Retrieved Context"):
+                    for i, chunk in enumerate(retrieved_chunks):
+                        source_name = Path(chunk['metadata']['source']).name
+                        st.info(
+                            f"**Chunk {i+1}** (Source: {source_name}, "
+                            f"Page: {chunk['metadata']['page']}, "
+                            f"Distance: {chunk['distance']:.4f})\n\n"
+                            f"> {chunk['content']}"
+                        )
+
+            except requests.exceptions.RequestException as e:
+                message_placeholder.error(f"Failed to get answer: {e}")
+            except Exception as e:
+                message_placeholder.error(f"An unexpected error occurred: {e}")
+
+        # Add assistant response to chat history
+        st.session_state.messages.append({"role": "assistant", "content": full_response})
+
+chat()